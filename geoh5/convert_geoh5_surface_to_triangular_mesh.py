@@ -44,28 +44,28 @@ def file_list(fld_pth):
 def create_solid_entity_list(wp):
     slds_lst = []
     for g in wp.groups:
-        slds_lst.extend(wp.get_entity(g.name)[0].children)
+        slds_lst.extend(g.children)
     #TODO: Add check to ensure surface objects only...
     return slds_lst
 
 
 def geoh5_file_to_mesh_file(msh_pth):
-    with Workspace(msh_pth) as workspace:
+    fd = msh_pth.parent
+    xt = ".ply"
+    with Workspace(msh_pth, mode="r") as workspace:
         solids_entity_list = create_solid_entity_list(workspace)
         for fp in solids_entity_list:
             name = fp.name
             mesh_verts = fp.vertices
             mesh_faces = fp.cells
             pv_msh = pv.make_tri_mesh(mesh_verts, mesh_faces)
-            fd = msh_pth.parent
             if msh_pth.stem == name:
                 msh_name = name
             else:
                 msh_name = f"{msh_pth.stem}_{name}"
-            xt = ".ply"
             nf = msh_name + xt
             save_path = fd.joinpath(nf)
-            pv_msh.save(save_path)
+            pv_msh.save(save_path, binary=True)
 
 
 # Script
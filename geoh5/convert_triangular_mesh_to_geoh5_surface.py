@@ -3,28 +3,36 @@ Convert triangular meshes to GEOH5 format file.
 
 Reads the following:
 * 3DFACEs from a DXF file
-* Any triangular mesh format supported by PyVista (PLY, OBJ, VTK, etc.)
+* Triangular meshes read by PyVista (PLY, OBJ, STL, VTK, VTP, OFF)
 
 Each target file should contain a single triangulated mesh surface or solid. 
 
 Saves the triangulated mesh as a geoh5 workspace file containing a single mesh
 object.
 
-Processes files in "single" or "batch" mode.
+Processes files in "single" or "batch" mode. Batch mode converts files with
+the suffixes listed in MESH_SUFFIXES.
 
 @author: D. Kinakin; J. Danielson
 
 Change log:
 2022-03-04 Initial version created for PLY and DXF
 2022-12-19 Updates to use PyVista to expand supported formats
+2026-10-15 Convert files in parallel in batch mode
 
 """
 
+import io
+import os
+import shutil
 import sys
+import tempfile
+import uuid
 import numpy as np
-import ezdxf as ed
 import pyvista as pv
 
+from concurrent.futures import ProcessPoolExecutor
+from operator import attrgetter
 from pathlib import Path
 from tqdm import tqdm
 from geoh5py.workspace import Workspace
@@ -34,6 +42,11 @@ from geoh5py.objects import Surface
 MODE = "single"  # batch or single
 INFOLDER = r"C:\Users\dkinakin\some_folder"  # for batch mode
 INFILE = r"C:\Users\dkinakin\some_file.dxf"  # for single file mode
+MESH_SUFFIXES = (  # supported input formats for batch mode
+    ".dxf", ".ply", ".obj", ".stl", ".vtk", ".vtp", ".off"
+)
+COMPRESSION = 1  # gzip level for geoh5 datasets, low level favours speed
+WORKERS = max(1, (os.cpu_count() or 2) // 2)  # parallel conversions in batch mode
 
 # Functions
 def file_list(fld_pth):
@@ -43,11 +56,13 @@ def file_list(fld_pth):
         fld_pth: Folder path to all files
 
     Returns:
-        file_list: List of full file paths
+        file_list: List of full file paths for supported mesh formats
     """
     
     pth_obj = Path(fld_pth)
-    file_list = list(pth_obj.iterdir())
+    file_list = sorted(
+        p for p in pth_obj.iterdir() if p.suffix.lower() in MESH_SUFFIXES
+    )
     return file_list
 
 
@@ -62,8 +77,32 @@ def read_dxf_file(fp):
         d: DXF file object
     """
     
+    import ezdxf as ed  # imported lazily, only needed for DXF input
+    # not exported at the top level of ezdxf, relies on ezdxf 1.0 or newer
+    from ezdxf.document import Drawing
+    from ezdxf.filemanagement import dxf_stream_info
+    from ezdxf.lldxf.tagger import binary_tags_loader
+    from ezdxf.lldxf.validator import is_dxf_stream
+
     try:
-        d = ed.readfile(fp)
+        # single bulk read, avoids many small reads on network drives
+        with open(fp, "rb") as f:
+            data = f.read()
+        if data.startswith(b"AutoCAD Binary DXF"):
+            d = Drawing.load(binary_tags_loader(data))
+        else:
+            # header is ASCII, sniff $DWGCODEPAGE to decode the rest
+            probe = io.TextIOWrapper(
+                io.BytesIO(data), encoding="utf-8", errors="ignore"
+            )
+            if not is_dxf_stream(probe):
+                raise IOError(f"File {fp} is not a DXF file.")
+            probe.seek(0)
+            info = dxf_stream_info(probe)
+            stream = io.TextIOWrapper(
+                io.BytesIO(data), encoding=info.encoding, errors="surrogateescape"
+            )
+            d = ed.read(stream)
         return d
     except IOError:
         print(f"Not a DXF file or a generic I/O error.")
@@ -98,40 +137,47 @@ def extract_dxf_3dfaces(dc):
     """
     
     msp = dc.modelspace()
-    fq = msp.query("3DFACE")
+    fq = list(msp.query("3DFACE"))
     return fq
 
 
-def create_triangle_array(fc):
+def create_triangle_array(fc_lst):
     """Create vertices for list of 3DFACEs
 
     Args:
-        fc: A 3DFACE queried from a DXF file object
+        fc_lst: 3DFACEs queried from a DXF file object
 
     Returns:
-        trngls: An array of the coordinates of the triangle vertices
+        trngls: An Nx3x3 array of the coordinates of the triangle vertices
     """
     
-    trngls = np.array((fc.dxf.vtx0, fc.dxf.vtx1, fc.dxf.vtx2))
-    trngls = trngls.reshape(3, 3)
+    crds = (
+        c
+        for d in map(attrgetter("dxf"), fc_lst)
+        for c in (*d.vtx0, *d.vtx1, *d.vtx2)
+    )
+    trngls = np.fromiter(crds, dtype=np.float64, count=9 * len(fc_lst))
+    trngls = trngls.reshape((-1, 3, 3))
     return trngls
 
 
-def dxf_triangle_list_to_pv_mesh(trngl_vrtx_lst, clean=False):
+def dxf_triangle_list_to_pv_mesh(trngl_vrtx_arr, clean=False):
     """Extracts 3DFACEs from a DXF file object in memory
 
     Args:
-        trngl_vrtx_lst: List of 3x3 arrays of coordinates for vertices of 
+        trngl_vrtx_arr: Nx3x3 array of coordinates for vertices of 
                         multiple triangles
 
     Returns:
         mesh: A PyVista mesh object
     """
     
-    triangle_array = np.stack(trngl_vrtx_lst)
-    vertices = triangle_array.reshape((-1, 3))
-    faces = np.arange(len(vertices)).reshape((-1, 3))
-    msh = pv.make_tri_mesh(vertices, faces)
+    vertices = trngl_vrtx_arr.reshape((-1, 3))
+    # VTK padded face table in vtkIdType, vertices are in triangle order
+    faces = np.empty((len(trngl_vrtx_arr), 4), dtype=pv.ID_TYPE)
+    faces[:, 0] = 3
+    faces[:, 1:] = np.arange(len(vertices), dtype=pv.ID_TYPE).reshape((-1, 3))
+    msh = pv.PolyData(vertices, faces)
     if clean:
         msh_out = msh.clean()
     else:
@@ -151,27 +197,68 @@ def dxf_tri_mesh_to_pyvista_mesh(dxf_pth):
     
     doc = read_dxf_file(dxf_pth)
     face_list = extract_dxf_3dfaces(doc)
-    triangle_vertex_list = [create_triangle_array(f) for f in face_list]
-    mesh = dxf_triangle_list_to_pv_mesh(triangle_vertex_list)
+    triangle_vertex_array = create_triangle_array(face_list)
+    mesh = dxf_triangle_list_to_pv_mesh(triangle_vertex_array)
     return mesh
 
 
-def create_workspace_file(flpth):
-    """Creates a geoh5 workspace file on disc to hold a coverted file.
+def geoh5_file_path(flpth):
+    """Path of the geoh5 workspace file written next to a mesh.
 
     Args:
         flpth: Path object for the location of mesh
 
     Returns:
-        wkspc: geoh5 workspace
+        out_pth: Path object for the workspace file
     """
     
     fd = flpth.parent 
     fn = flpth.stem
     xt = ".geoh5"
     nf = fn + xt
-    wkspc = Workspace(fd.joinpath(nf))
-    return wkspc
+    out_pth = fd.joinpath(nf)
+    return out_pth
+
+
+def create_workspace_file(flpth):
+    """Creates a geoh5 workspace file in the local temp folder to hold a
+    coverted file. The file is moved next to the mesh once written. An
+    existing workspace next to the mesh is copied in first so the surface is
+    added to it rather than replacing it.
+
+    Args:
+        flpth: Path object for the location of mesh
+
+    Returns:
+        wkspc: geoh5 workspace
+        tmp_pth: Path object for the temporary workspace file
+    """
+    
+    fn = flpth.stem
+    xt = ".geoh5"
+    nf = f"{fn}_{uuid.uuid4().hex}{xt}"
+    tmp_pth = Path(tempfile.gettempdir()).joinpath(nf)
+    out_pth = geoh5_file_path(flpth)
+    if out_pth.exists():
+        shutil.copyfile(out_pth, tmp_pth)
+    wkspc = Workspace(tmp_pth)
+    return wkspc, tmp_pth
+
+
+def move_workspace_file(tmp_pth, flpth):
+    """Moves a closed temporary geoh5 workspace file next to the mesh.
+
+    Args:
+        tmp_pth: Path object for the temporary workspace file
+        flpth: Path object for the location of mesh
+
+    Returns:
+        out_pth: Path object for the final workspace file
+    """
+    
+    out_pth = geoh5_file_path(flpth)
+    shutil.move(tmp_pth, out_pth)
+    return out_pth
 
 
 def pv_mesh_to_geoh5_surface(pvmsh, gh5wkspc, msh_nm):
@@ -185,10 +272,19 @@ def pv_mesh_to_geoh5_surface(pvmsh, gh5wkspc, msh_nm):
         srfc: Mesh written to geoh5
     """
 
-    vrts = pvmsh.points
+    # geoh5 stores vertices as float64 and float32 would lose precision on UTM
+    # coordinates, so keep float64, upcasting float32 points (e.g. PLY, STL)
+    vrts = np.ascontiguousarray(pvmsh.points, dtype=np.float64)
     # extract triangle faces without VTK padding
-    clls = pvmsh.faces.reshape((pvmsh.n_faces, 4))[:, 1:]  
-    srfc = Surface.create(gh5wkspc, vertices=vrts, cells=clls, name=msh_nm)
+    if hasattr(pvmsh, "regular_faces"):
+        clls = pvmsh.regular_faces
+    else:
+        clls = np.ascontiguousarray(pvmsh.faces.reshape((-1, 4))[:, 1:])
+    srfc = gh5wkspc.create_entity(
+        Surface,
+        compression=COMPRESSION,
+        entity={"vertices": vrts, "cells": clls, "name": msh_nm},
+    )
     return srfc
 
 
@@ -205,14 +301,49 @@ def mesh_file_to_geoh5_file(msh_pth):
     """
     msh_name = msh_pth.stem
     
-    if msh_pth.suffix == ".dxf":
+    if msh_pth.suffix.lower() == ".dxf":
         msh = dxf_tri_mesh_to_pyvista_mesh(msh_pth)
     else:
         msh = read_pyvista_compatible_file(msh_pth)
     
-    wp = create_workspace_file(msh_pth)
-    pv_mesh_to_geoh5_surface(msh, wp, msh_name)
-    wp.close()
+    wp, tmp_pth = create_workspace_file(msh_pth)
+    try:
+        pv_mesh_to_geoh5_surface(msh, wp, msh_name)
+        wp.close()
+    except BaseException:
+        wp.close()
+        tmp_pth.unlink(missing_ok=True)
+        raise
+    move_workspace_file(tmp_pth, msh_pth)
+
+
+def mesh_files_to_geoh5_file(msh_pth_lst):
+    """Converts meshes sharing a file stem into the same geoh5 file, one after
+    the other, so each surface is added to the workspace in turn.
+
+    Args:
+        msh_pth_lst: List of Path objects for meshes with the same stem
+
+    Returns:
+        None
+    """
+    for msh_pth in msh_pth_lst:
+        mesh_file_to_geoh5_file(msh_pth)
+
+
+def group_by_geoh5_file(file_path_list):
+    """Groups mesh paths by the geoh5 file they are written to.
+
+    Args:
+        file_path_list: List of mesh Path objects
+
+    Returns:
+        groups: List of lists of mesh Path objects
+    """
+    groups = {}
+    for pth in file_path_list:
+        groups.setdefault(geoh5_file_path(pth), []).append(pth)
+    return list(groups.values())
 
 
 # Script
@@ -230,9 +361,11 @@ if __name__ == "__main__":
         with tqdm(total=len(file_path_list),
                   ncols=80,
                   desc="BATCH WRITING TO GEOH5...") as pbar:
-            for pth in file_path_list:
-                target_path = Path(pth)
-                mesh_file_to_geoh5_file(target_path)
-                pbar.update()
+            # meshes sharing a stem go to one worker to append in order
+            path_groups = group_by_geoh5_file(file_path_list)
+            with ProcessPoolExecutor(max_workers=WORKERS) as ex:
+                results = ex.map(mesh_files_to_geoh5_file, path_groups)
+                for grp, _ in zip(path_groups, results):
+                    pbar.update(len(grp))
     else:
         print("No mode selected.")
@@ -13,16 +13,19 @@ Reads a TOML file with the following block model parameters:
 
 Outputs a GEOH5 format file to the specified filepath. 
 
+Uses pyarrow, if installed, to speed up reading the block model coordinates.
+
 @author: D. Kinakin
 
 Change log:
 2023-01-03 Initial version based on Python 3.10
+2026-10-15 Map XYZ data directly to block model cells instead of interpolating
 
 """
 
+import importlib.util
 import numpy as np
 import pandas as pd
-import pyvista as pv
 import toml
 
 from pathlib import Path
@@ -33,49 +36,123 @@ from geoh5py.objects import BlockModel
 # Globals
 TOML_PATH = r"C:\Users\dkinakin\Desktop\example_block_model_parameters.toml"
 GEOH5_PATH = r"C:\Users\dkinakin\Desktop\my_block_model.geoh5"
+COMPRESSION = 1  # gzip level for geoh5 datasets, low level favours speed
+# optional pyarrow for the multithreaded coordinate read, else pandas C engine
+CSV_ENGINE = "pyarrow" if importlib.util.find_spec("pyarrow") else "c"
+CHUNK_ROWS = 1_000_000  # CSV rows held in memory while mapping data
 
 
 # Functions
 def read_xyz_file_to_dataframe(xyzfilepth, xc_name, yc_name, zc_name):
-    print("Reading model data from CSV...")
+    print("Reading model coordinates from CSV...")
     column_renames = {
         xc_name: "x",
         yc_name: "y",
         zc_name: "z",
     }
+    coord_list = [xc_name, yc_name, zc_name]
 
-    bm = pd.read_csv(xyzfilepth)
+    bm = pd.read_csv(
+        xyzfilepth,
+        usecols=coord_list,
+        dtype={c: np.float64 for c in coord_list},
+        engine=CSV_ENGINE,
+    )
     bm = bm.rename(column_renames, axis="columns")
     return bm
 
 
-def point_set_from_xyz_dataframe(xyzdf, float_val_list, int_val_param_list):
-    print("Creating PyVista points from XYZ...")
-    points = pv.PointSet(xyzdf[["x", "y", "z"]].to_numpy(dtype=np.float32))
+def read_xyz_file_in_chunks(
+    xyzfilepth, xc_name, yc_name, zc_name, float_val_list, int_val_param_list
+):
+    column_renames = {
+        xc_name: "x",
+        yc_name: "y",
+        zc_name: "z",
+    }
+    coord_list = [xc_name, yc_name, zc_name]
+    column_types = {
+        **{c: np.float64 for c in coord_list},
+        **{p: np.float32 for p in float_val_list},
+        **{i: "Int8" for i in int_val_param_list},  # nullable, blanks allowed
+    }
+
+    # the pyarrow engine does not support chunksize
+    with pd.read_csv(
+        xyzfilepth,
+        usecols=coord_list + float_val_list + int_val_param_list,
+        dtype=column_types,
+        chunksize=CHUNK_ROWS,
+        engine="c",
+    ) as reader:
+        for chunk in reader:
+            yield chunk.rename(column_renames, axis="columns")
+
+
+def axis_index_from_coordinates(crd, n, s, o, axis_name):
+    # offset from the first centroid, which sits half a block in from origin
+    offset = crd - (o + s / 2)
+    idx = np.rint(offset / s).astype(np.int64)
+    if idx.min() < 0 or idx.max() >= n or not np.allclose(
+        idx * s, offset, rtol=0.0, atol=1e-3 * s
+    ):
+        raise ValueError(
+            f"{axis_name} coordinates do not fall on a regular grid of {n} "
+            f"blocks at {s} spacing; check for missing or irregular centroids."
+        )
+    return idx
+
+
+def grid_index_from_xyz(xyz, xn, yn, zn, xs, ys, zs, origin):
+    ix = axis_index_from_coordinates(xyz[:, 0], xn, xs, origin[0], "X")
+    iy = axis_index_from_coordinates(xyz[:, 1], yn, ys, origin[1], "Y")
+    iz = axis_index_from_coordinates(xyz[:, 2], zn, zs, origin[2], "Z")
+    # geoh5 block model cell order: z fastest, then u, then v
+    return iy * xn * zn + ix * zn + iz
 
+
+def block_values_from_xyz_chunks(
+    xyzchunks, n_cells, grid, float_val_list, int_val_param_list
+):
+    print("Mapping XYZ data on to block model cells...")
+    values = {}
     for p in float_val_list:
-        points[p] = xyzdf[p].to_numpy(dtype=np.float32)
+        values[p] = np.full(n_cells, np.nan, dtype=np.float32)
 
     for i in int_val_param_list:
-        points[i] = xyzdf[i].to_numpy(dtype=np.int8)
-    return points
+        values[i] = np.zeros(n_cells, dtype=np.int8)
+
+    for xyzdf in xyzchunks:
+        cell_idx = grid_index_from_xyz(xyzdf[["x", "y", "z"]].to_numpy(), *grid)
+        float_block = xyzdf[float_val_list].to_numpy(dtype=np.float32)
+        # blank integer cells map to 0, "Unknown" in the value map
+        int_block = xyzdf[int_val_param_list].fillna(0).to_numpy(dtype=np.int8)
+
+        for j, p in enumerate(float_val_list):
+            values[p][cell_idx] = float_block[:, j]
+
+        for j, i in enumerate(int_val_param_list):
+            values[i][cell_idx] = int_block[:, j]
+    return values
 
 
 def extract_block_model_grid_from_xyz_dataframe(xyzdf):
     print("Extracting block model grid configuration...")
-    e = xyzdf["x"].unique()
-    n = xyzdf["y"].unique()
-    z = xyzdf["z"].unique()
+    grid = xyzdf[["x", "y", "z"]].agg(["min", "max", "nunique"])
 
-    xn = e.shape[0]
-    yn = n.shape[0]
-    zn = z.shape[0]
+    xn = int(grid.at["nunique", "x"])
+    yn = int(grid.at["nunique", "y"])
+    zn = int(grid.at["nunique", "z"])
 
-    xs = (e.max() - e.min()) / (xn - 1)
-    ys = (n.max() - n.min()) / (yn - 1)
-    zs = (z.max() - z.min()) / (zn - 1)
+    xs = (grid.at["max", "x"] - grid.at["min", "x"]) / (xn - 1)
+    ys = (grid.at["max", "y"] - grid.at["min", "y"]) / (yn - 1)
+    zs = (grid.at["max", "z"] - grid.at["min", "z"]) / (zn - 1)
 
-    origin = [e.min() - xs / 2, n.min() - ys / 2, z.min() - zs / 2]
+    origin = [
+        grid.at["min", "x"] - xs / 2,
+        grid.at["min", "y"] - ys / 2,
+        grid.at["min", "z"] - zs / 2,
+    ]
 
     print(f"Block dim X = {xs} for {xn} blocks")
     print(f"Block dim Y = {ys} for {yn} blocks")
@@ -100,70 +177,78 @@ float_parameters = block_model_params["parameters"]["float_params"]
 integer_parameters = block_model_params["parameters"]["integer_params"]
 all_value_maps = block_model_params["mapping"]
 
-# Extract data from original block model file
-block_model_dataframe = read_xyz_file_to_dataframe(
+# Extract grid from original block model file coordinates
+block_model_coordinates = read_xyz_file_to_dataframe(
     block_model_file_path, block_model_x, block_model_y, block_model_z
 )
 xn, yn, zn, xs, ys, zs, origin = extract_block_model_grid_from_xyz_dataframe(
-    block_model_dataframe
-)
-points = point_set_from_xyz_dataframe(
-    block_model_dataframe, float_parameters, integer_parameters
+    block_model_coordinates
 )
+del block_model_coordinates
 
 # Create geoh5 block model and add data
 with Workspace(geoh5_path) as workspace:
     blockmodel = BlockModel.create(
         workspace,
         origin=origin,
-        u_cell_delimiters=np.cumsum(
-            np.pad(np.ones(xn) * xs, (1, 0), "constant")
-        ),  # Offsets along u
-        v_cell_delimiters=np.cumsum(
-            np.pad(np.ones(yn) * ys, (1, 0), "constant")
-        ),  # Offsets along v
-        z_cell_delimiters=np.cumsum(
-            np.pad(np.ones(zn) * zs, (1, 0), "constant")
-        ),  # Offsets along z
+        u_cell_delimiters=np.arange(xn + 1, dtype=np.float64) * xs,  # Offsets along u
+        v_cell_delimiters=np.arange(yn + 1, dtype=np.float64) * ys,  # Offsets along v
+        z_cell_delimiters=np.arange(zn + 1, dtype=np.float64) * zs,  # Offsets along z
         rotation=0.0,
         name=block_model_name,
     )
 
-    # Interpolate data from provided points to block model grid centroids
-    print("Interpolating data on to block model grid...")
-    bm_xyz_df = pv.PolyData(blockmodel.centroids)
-    bm_xyz_df = bm_xyz_df.interpolate(
-        points, sharpness=5, n_points=1, strategy="null_value"
+    # Index the block model cell for each XYZ row on the regular grid
+    n_cells = xn * yn * zn
+    grid = (xn, yn, zn, xs, ys, zs, origin)
+    block_values = block_values_from_xyz_chunks(
+        read_xyz_file_in_chunks(
+            block_model_file_path,
+            block_model_x,
+            block_model_y,
+            block_model_z,
+            float_parameters,
+            integer_parameters,
+        ),
+        n_cells,
+        grid,
+        float_parameters,
+        integer_parameters,
     )
 
-    # Add interpolated data to block model grid
+    # Add mapped data to block model grid
     for p in float_parameters:
         print(f"Adding float value {p} to block model...")
         blockmodel.add_data(
             {
                 p: {
                     "association": "CELL",
-                    "values": bm_xyz_df[p],
+                    "values": block_values[p],
                     "entity_type": {"primitive_type": "FLOAT"},
                 }
-            }
+            },
+            compression=COMPRESSION,
         )
 
     for i in integer_parameters:
         print(f"Adding integer value {i} to block model...")
         value_map_raw = all_value_maps[i]
-        value_map = {int(k): v for k, v in value_map_raw.items()}
+        value_keys = np.fromiter(
+            value_map_raw.keys(), dtype=np.int64, count=len(value_map_raw)
+        )
+        value_map = dict(zip(value_keys.tolist(), value_map_raw.values()))
         value_map[0] = "Unknown"
         blockmodel.add_data(
             {
                 i: {
                     "association": "CELL",
-                    "values": bm_xyz_df[i],
+                    "values": block_values[i],
                     "entity_type": {
                         "primitive_type": "REFERENCED",
                         "value_map": value_map,
                     },
                 }
-            }
+            },
+            compression=COMPRESSION,
         )
 print("Complete!")
@@ -12,12 +12,15 @@ D. Kinakin, J. Danielson
 2022-03-04
 """
 
+import io
 import sys
 import os
 import numpy as np
-import ezdxf as ed
 import trimesh as tm
 
+from concurrent.futures import ProcessPoolExecutor
+from operator import attrgetter
+from pathlib import Path
 from tqdm import tqdm
 from geoh5py.workspace import Workspace
 from geoh5py.objects import Surface
@@ -28,6 +31,7 @@ MODE = "batch" # batch or single
 INFOLDER = r"C:\Users\dkinakin\Desktop\batch_test" # for batch mode
 INFILE = r"C:\Users\dkinakin\Desktop\Fault Model V1\EN1_V1.ply" # for single mode
 EXT = "ply"
+WORKERS = max(1, (os.cpu_count() or 2) // 2) # parallel conversions in batch mode
 
 # Functions
 def file_list(fld_pth, fl_xt):
@@ -46,8 +50,7 @@ def file_list(fld_pth, fl_xt):
     List
         List of full file paths
     """
-    folder_contents = os.listdir(fld_pth)
-    filtered_file_list = [os.path.join(fld_pth, f) for f in folder_contents if f.endswith(fl_xt)]
+    filtered_file_list = sorted(Path(fld_pth).glob(f"*.{fl_xt}"))
 
     return filtered_file_list
 
@@ -66,8 +69,32 @@ def read_dxf_file(fp):
     -------
     DXF file object
     """
+    import ezdxf as ed  # imported lazily, only needed for DXF input
+    # not exported at the top level of ezdxf, relies on ezdxf 1.0 or newer
+    from ezdxf.document import Drawing
+    from ezdxf.filemanagement import dxf_stream_info
+    from ezdxf.lldxf.tagger import binary_tags_loader
+    from ezdxf.lldxf.validator import is_dxf_stream
+
     try:
-        d = ed.readfile(fp)
+        # single bulk read, avoids many small reads on network drives
+        with open(fp, "rb") as f:
+            data = f.read()
+        if data.startswith(b"AutoCAD Binary DXF"):
+            d = Drawing.load(binary_tags_loader(data))
+        else:
+            # header is ASCII, sniff $DWGCODEPAGE to decode the rest
+            probe = io.TextIOWrapper(
+                io.BytesIO(data), encoding="utf-8", errors="ignore"
+            )
+            if not is_dxf_stream(probe):
+                raise IOError(f"File {fp} is not a DXF file.")
+            probe.seek(0)
+            info = dxf_stream_info(probe)
+            stream = io.TextIOWrapper(
+                io.BytesIO(data), encoding=info.encoding, errors="surrogateescape"
+            )
+            d = ed.read(stream)
         return d
     except IOError:
         print(f"Not a DXF file or a generic I/O error.")
@@ -111,25 +138,26 @@ def dxf_3dfaces(dc):
         A list of 3DFACEs from the DXF
     """
     msp = dc.modelspace()
-    fq = msp.query("3DFACE")
+    fq = list(msp.query("3DFACE"))
     return fq
 
 
-def triangle_array(fc):
+def triangle_array(fc_lst):
     """Extracts 3DFACEs from a ezdxf.document.Drawing object in memory
 
     Paramters
     ---------
-    fc : ?
-        A 3DFACE queried from a DXF file object
+    fc_lst : list
+        3DFACEs queried from a DXF file object
     
     Returns
     -------
     array
-        An array of the coordinates of the triangle vertices
+        An Nx3x3 array of the coordinates of the triangle vertices
     """
-    trngl = np.array((fc.dxf.vtx0, fc.dxf.vtx1, fc.dxf.vtx2))
-    trngl = trngl.reshape(3, 3)
+    crds = (c for d in map(attrgetter("dxf"), fc_lst) for c in (*d.vtx0, *d.vtx1, *d.vtx2))
+    trngl = np.fromiter(crds, dtype=np.float64, count=9 * len(fc_lst))
+    trngl = trngl.reshape((-1, 3, 3))
     return trngl
 
 
@@ -147,8 +175,8 @@ def triangles_to_mesh(ta):
         A Trimesh mesh object
     """
     trikwargs = tm.triangles.to_kwargs(ta)
-    m = tm.Trimesh(**trikwargs, validate=True)
-    m.fix_normals()
+    # geoh5 only needs raw vertices and faces, skip validation and normals
+    m = tm.Trimesh(**trikwargs, validate=False, process=False)
     return m
 
 
@@ -189,7 +217,7 @@ def geoh5_export(wkspc, msh):
     srfc
         Mesh written to geoh5 worskspace
     """
-    vrts = msh.vertices
+    vrts = np.ascontiguousarray(msh.vertices, dtype=np.float64)
     clls = msh.faces
     srfc = Surface.create(wkspc,
                           vertices=vrts,
@@ -202,8 +230,7 @@ def dxf_to_geoh5(dxf_pth):
     """
     doc = read_dxf_file(dxf_pth)
     face_list = dxf_3dfaces(doc)
-    triangle_list = [triangle_array(f) for f in face_list]
-    triangle_arrays = np.stack(triangle_list)
+    triangle_arrays = triangle_array(face_list)
     mesh = triangles_to_mesh(triangle_arrays)
     wp = create_workspace_file(dxf_pth)
     geoh5_export(wp, mesh)
@@ -237,14 +264,14 @@ if __name__ == "__main__":
         conversion_file_path_list = file_list(INFOLDER, EXT)
         if EXT == "dxf":
             with tqdm(total=len(conversion_file_path_list), ncols=80, desc="DXF>GEOH5") as pbar:
-                for dxf in conversion_file_path_list:
-                    dxf_to_geoh5(dxf)
-                    pbar.update()
+                with ProcessPoolExecutor(max_workers=WORKERS) as ex:
+                    for _ in ex.map(dxf_to_geoh5, conversion_file_path_list):
+                        pbar.update()
         elif EXT == "ply":
             with tqdm(total=len(conversion_file_path_list), ncols=80, desc="PLY>GEOH5") as pbar:
-                for ply in conversion_file_path_list:
-                    ply_to_geoh5(ply)
-                    pbar.update()
+                with ProcessPoolExecutor(max_workers=WORKERS) as ex:
+                    for _ in ex.map(ply_to_geoh5, conversion_file_path_list):
+                        pbar.update()
         else:
             print("No valid extension selected.")     
 
@@ -16,7 +16,6 @@ import sys
 import os
 import json
 import numpy as np
-import ezdxf as ed
 import trimesh as tm
 
 from tqdm import tqdm
@@ -67,6 +66,8 @@ def read_dxf_file(fp):
     -------
     DXF file object
     """
+    import ezdxf as ed  # imported lazily, only needed for DXF input
+
     try:
         d = ed.readfile(fp)
         return d
@@ -129,8 +130,11 @@ def triangle_array(fc):
     array
         An array of the coordinates of the triangle vertices
     """
-    trngl = np.array((fc.dxf.vtx0, fc.dxf.vtx1, fc.dxf.vtx2))
-    trngl = trngl.reshape(3, 3)
+    d = fc.dxf
+    trngl = np.empty((3, 3), dtype=np.float64)
+    trngl[0] = d.vtx0
+    trngl[1] = d.vtx1
+    trngl[2] = d.vtx2
     return trngl
 
 
@@ -148,8 +152,8 @@ def triangles_to_mesh(ta):
         A Trimesh mesh object
     """
     trikwargs = tm.triangles.to_kwargs(ta)
-    m = tm.Trimesh(**trikwargs, validate=True)
-    m.fix_normals()
+    # geoh5 only needs raw vertices and faces, skip validation and normals
+    m = tm.Trimesh(**trikwargs, validate=False, process=False)
     return m
 
 
@@ -190,7 +194,7 @@ def geoh5_export(wkspc, msh):
     srfc
         Mesh written to geoh5 worskspace
     """
-    vrts = msh.vertices
+    vrts = np.ascontiguousarray(msh.vertices, dtype=np.float64)
     clls = msh.faces
     srfc = Surface.create(wkspc,
                           vertices=vrts,